@@ -1,5 +1,26 @@
 import multiprocessing
+import os
 
 bind = "unix:/run/tawhiri/v1.sock"
 pidfile = "/run/tawhiri/v1.pid"
 workers = 12
+
+# Once predictions are run in a process pool (the PREDICTION_PROCESSES
+# setting), use threaded workers so that a worker can serve other requests
+# (e.g. listing datasets) while its predictions run. Without the pool they
+# would only contend for the GIL, which the solver holds throughout.
+#worker_class = "gthread"
+#threads = 4
+
+# Load the app, and open the datasets, in the master process so that the
+# workers share the memory mapped datasets (copy-on-write) after forking.
+# The master keeps the wind dataset it opened mapped until it is restarted,
+# so its disk space isn't freed when the downloader deletes it.
+preload_app = True
+
+def when_ready(server):
+    from tawhiri.api import app, init_app
+    # As tawhiri-webapp does (see tawhiri.manager)
+    if 'TAWHIRI_SETTINGS' in os.environ:
+        app.config.from_envvar('TAWHIRI_SETTINGS')
+    init_app(app)
@@ -20,8 +20,23 @@ Provide the HTTP API for Tawhiri.
 """
 #test docker download zip update
 
-from flask import Flask, jsonify, request, g
+from flask import Flask, Response, json, request, g, \
+                  stream_with_context
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, \
+    TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import lru_cache
+import calendar
+import hashlib
+import multiprocessing
+import os
+import queue
+import re
+import threading
 import time
 import strict_rfc3339
 import subprocess
@@ -29,52 +44,524 @@ from tawhiri import solver, models
 from tawhiri.dataset import Dataset as WindDataset
 from tawhiri.warnings import WarningCounts
 from ruaumoko import Dataset as ElevationDataset
+from werkzeug.exceptions import NotFound
+
+try:
+    import ciso8601
+except ImportError:
+    ciso8601 = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    orjson = None
 
 app = Flask(__name__)
 
+if orjson is not None:
+    class OrjsonProvider(DefaultJSONProvider):
+        """
+        Serialise responses with orjson, which is considerably faster than
+        the json module on long trajectories.
+        """
+        # Pass datetimes through to `default` so they are formatted as they
+        # would be by the default provider.
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY
+
+        @staticmethod
+        def default(o):
+            # orjson doesn't serialise tuple subclasses (e.g. namedtuples)
+            if isinstance(o, tuple):
+                return list(o)
+            return DefaultJSONProvider.default(o)
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=self.default,
+                                option=self.option).decode()
+
+    app.json = OrjsonProvider(app)
+
 API_VERSION = 1
 LATEST_DATASET_KEYWORD = "latest"
 PROFILE_STANDARD = "standard_profile"
 PROFILE_FLOAT = "float_profile"
 
+# Seconds between datasets (which are published every 6 hours)
+DATASET_PERIOD = 6 * 60 * 60
+
+# Seconds for which the list of downloaded dataset names is re-used before the
+# dataset directory is scanned again.
+DATASET_LIST_TTL = 60
+
+# Seconds for which a requested dataset is treated as present while it is
+# downloaded, before it may be requested again.
+DATASET_DOWNLOAD_TTL = 60 * 60
+
+# Request parameters which hold UNIX timestamps, to be returned as RFC3339
+_DATETIME_KEYS = ("launch_datetime", "stop_datetime")
+
+# Number of wind datasets (including the latest) which are kept open so that
+# subsequent predictions using them needn't re-open (and re-map) the file.
+WIND_DATASET_CACHE_SIZE = 4
+
+# Number of trajectory points serialised at a time when streaming a response
+STREAM_CHUNK_POINTS = 1000
+
+# Number (and total size, in bytes) of prediction responses kept for re-use by
+# identical requests, and for how many seconds. (This is also the max-age
+# given to HTTP caches.)
+PREDICTION_CACHE_SIZE = 1024
+PREDICTION_CACHE_BYTES = 256 * 1024 * 1024
+PREDICTION_CACHE_TTL = 3600
+
+# Seconds to wait for a prediction run in the process pool (see
+# TawhiriConfig.prediction_processes) before giving up on it. (The prediction
+# itself can't be interrupted, so runs to completion in a discarded pool.)
+PREDICTION_TIMEOUT = 60
+
+# Decimal places (of a degree) to which launch sites are rounded before the
+# elevation lookup is memoised. 4 places is roughly 11m.
+ELEVATION_CACHE_PRECISION = 4
+
 
 # Util functions ##############################################################
+@dataclass(frozen=True)
+class TawhiriConfig:
+    """
+    The settings used on the request path, resolved from the app config once.
+    """
+    wind_dataset_dir: str
+    elevation_dataset: str
+    #: Number of processes to run predictions in; 0 runs them in the request
+    #: thread.
+    prediction_processes: int = 0
+    #: Maximum number of predictions in a request to the batch endpoint.
+    max_batch_size: int = 100
+    #: Whether the /admin/ endpoints are served. They aren't authenticated,
+    #: so should only be enabled if they can't be reached publicly.
+    admin_api: bool = False
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            wind_dataset_dir=config.get('WIND_DATASET_DIR',
+                                        WindDataset.DEFAULT_DIRECTORY),
+            elevation_dataset=config.get('ELEVATION_DATASET',
+                                         ElevationDataset.default_location),
+            prediction_processes=config.get('PREDICTION_PROCESSES', 0),
+            max_batch_size=config.get('MAX_BATCH_SIZE', 100),
+            admin_api=config.get('ADMIN_API', False),
+        )
+
+def _config():
+    """
+    Return the app's :class:`TawhiriConfig`.
+
+    This is normally created by `init_app`, but is created on first use if
+    that hasn't been called (e.g. in the test suite).
+    """
+    try:
+        return app.extensions['tawhiri']
+    except KeyError:
+        cfg = app.extensions['tawhiri'] = TawhiriConfig.from_config(app.config)
+        return cfg
+
+def init_app(app):
+    """
+    Resolve the app's :class:`TawhiriConfig`, and open the elevation dataset
+    and the latest wind dataset ahead of the first request.
+
+    This should be called once the app config has been loaded. When run
+    under gunicorn with ``preload_app`` (see deploy/gunicorn_cfg.py) it is
+    called in the master process, so the workers forked from it share the
+    already memory mapped datasets rather than each opening their own. (The
+    master serves no requests, so never re-scans the dataset directory; it
+    keeps the wind dataset it opened mapped, and its disk space in use
+    after the downloader deletes it, until gunicorn is restarted.)
+    """
+    cfg = app.extensions['tawhiri'] = TawhiriConfig.from_config(app.config)
+    _open_datasets(cfg)
+
+def _open_datasets(cfg):
+    """
+    Open the elevation dataset and the latest wind dataset, logging (rather
+    than raising) if either is missing.
+    """
+    try:
+        ruaumoko_ds()
+    except Exception:
+        app.logger.warning("Unable to open elevation dataset %s",
+                           cfg.elevation_dataset, exc_info=True)
+
+    try:
+        _get_wind_dataset(_latest_dataset_time(cfg.wind_dataset_dir),
+                          cfg.wind_dataset_dir)
+    except Exception:
+        app.logger.warning("Unable to open latest wind dataset in %s",
+                           cfg.wind_dataset_dir, exc_info=True)
+
+@lru_cache(maxsize=1)
 def ruaumoko_ds():
-    if not hasattr("ruaumoko_ds", "once"):
-        ds_loc = app.config.get('ELEVATION_DATASET', ElevationDataset.default_location)
-        ruaumoko_ds.once = ElevationDataset(ds_loc)
+    """
+    Return the elevation dataset, opening it on first use only.
+    """
+    return ElevationDataset(_config().elevation_dataset)
+
+@lru_cache(maxsize=16384)
+def _elevation_lookup(lat, lon):
+    """
+    Look up the ground elevation at (`lat`, `lon`) using Ruaumoko.
+
+    Launches tend to be made from a small number of well known sites, so the
+    result is memoised. Callers should round the coordinates (see
+    `ELEVATION_CACHE_PRECISION`) so that nearby requests share an entry.
+    """
+    return ruaumoko_ds().get(lat, lon)
+
+_wind_datasets = OrderedDict()
+_wind_datasets_lock = threading.Lock()
+
+def _resolve_dataset(req, ds_dir):
+    """
+    Work out which wind dataset `req` should use, and open it.
+
+    Old datasets which aren't present are requested from the downloader.
+    Both that check and the choice of the latest dataset use the dataset
+    index (see `_get_dataset_index`), so the dataset directory is scanned at
+    most once, rather than again by :meth:`WindDataset.open_latest`.
+    """
+    if _is_old_dataset(req, ds_dir):
+        _download_old_dataset(req['dataset_time'])
+
+    ds_time = req['dataset']
+    if ds_time == LATEST_DATASET_KEYWORD:
+        ds_time = _latest_dataset_time(ds_dir)
+    elif not isinstance(ds_time, datetime):
+        # A dataset given in the request, as a UNIX timestamp
+        ds_time = datetime.utcfromtimestamp(ds_time)
+
+    return _get_wind_dataset(ds_time, ds_dir)
+
+def _latest_dataset_time(ds_dir):
+    """
+    Return the time of the most recent complete dataset in `ds_dir`.
+    """
+    present = [ds.ds_time for ds in _get_dataset_index(ds_dir).values()
+               if ds is not None and ds.suffix == '']
+    if not present:
+        raise IOError("No datasets in {0}".format(ds_dir))
+    return max(present)
+
+def _get_wind_dataset(ds_time, ds_dir):
+    """
+    Open the wind dataset for `ds_time` in `ds_dir`.
+
+    Datasets (including the latest) are kept in a small LRU cache shared by
+    all requests.
+    """
+    key = (ds_dir, ds_time)
+    with _wind_datasets_lock:
+        if key in _wind_datasets:
+            _wind_datasets.move_to_end(key)
+            return _wind_datasets[key]
+
+    # Open without holding the lock; if another request beat us to it, use
+    # theirs and let ours be closed when it is garbage collected.
+    tawhiri_ds = WindDataset(ds_time, directory=ds_dir)
+
+    with _wind_datasets_lock:
+        tawhiri_ds = _wind_datasets.setdefault(key, tawhiri_ds)
+        _wind_datasets.move_to_end(key)
+        while len(_wind_datasets) > WIND_DATASET_CACHE_SIZE:
+            # Evicted datasets aren't closed explicitly as a prediction may
+            # still be using them; Dataset.__del__ closes them once released.
+            _wind_datasets.popitem(last=False)
+
+    return tawhiri_ds
+
+# Process pool for predictions, created on first use; see _get_prediction_pool()
+_prediction_pool = None
+_prediction_pool_lock = threading.Lock()
+
+def _get_prediction_pool():
+    """
+    Return the process pool that predictions are run in, or ``None`` if they
+    should be run in the request thread (the default).
+
+    The pool is created lazily so that, under gunicorn, each worker creates
+    its own after it has been forked. Its processes are started by a fork
+    server rather than forked from the worker itself, as the worker's other
+    threads may be holding locks (e.g., logging's) which a forked child would
+    inherit, held, forever. They are given the config explicitly, and open
+    the datasets as they start (see `_init_prediction_process`) rather than
+    on their first prediction.
+    """
+    global _prediction_pool
+
+    cfg = _config()
+    if not cfg.prediction_processes:
+        return None
+
+    with _prediction_pool_lock:
+        if _prediction_pool is None:
+            _prediction_pool = ProcessPoolExecutor(
+                max_workers=cfg.prediction_processes,
+                mp_context=multiprocessing.get_context("forkserver"),
+                initializer=_init_prediction_process, initargs=(cfg, ))
+        return _prediction_pool
+
+def _discard_prediction_pool(pool):
+    """
+    Stop using `pool` (e.g., because one of its processes died, or is stuck
+    on a prediction which timed out), so that `_get_prediction_pool` creates
+    a new one.
+
+    Predictions already submitted to `pool` are left to finish, and its
+    processes exit once they have; there is no way to interrupt a running
+    prediction.
+    """
+    global _prediction_pool
+
+    with _prediction_pool_lock:
+        if _prediction_pool is pool:
+            _prediction_pool = None
+    pool.shutdown(wait=False)
+
+def _submit_prediction(pool, req, ds_time):
+    """
+    Submit the prediction for `req` to `pool`, returning the pool it was
+    submitted to and its future.
+
+    If one of `pool`'s processes died while it was idle (e.g., killed when
+    memory ran short), the pool refuses new work; it is discarded, and the
+    prediction submitted to a new pool instead.
+    """
+    try:
+        return pool, pool.submit(_solve_in_process, req, ds_time)
+    except BrokenProcessPool:
+        _discard_prediction_pool(pool)
+
+    pool = _get_prediction_pool()
+    try:
+        return pool, pool.submit(_solve_in_process, req, ds_time)
+    except BrokenProcessPool:
+        _discard_prediction_pool(pool)
+        raise PredictionException("Prediction process failed.")
+
+def _init_prediction_process(cfg):
+    """
+    Initialise a prediction pool process with the parent's config.
+    """
+    app.extensions['tawhiri'] = cfg
+    _open_datasets(cfg)
+
+# WarningCounts objects which are free to be re-used by another prediction;
+# see _checkout_warningcounts()
+_warningcounts_pool = queue.LifoQueue()
+
+@contextmanager
+def _checkout_warningcounts():
+    """
+    Check out a WarningCounts, reset ready for a new prediction, for the
+    duration of the with block.
+
+    Objects are re-used from a pool (most recently returned first) rather
+    than being allocated for each prediction; there are only ever as many
+    as there are predictions running at once.
+    """
+    try:
+        warningcounts = _warningcounts_pool.get_nowait()
+    except queue.Empty:
+        warningcounts = WarningCounts()
+    else:
+        warningcounts.reset()
+
+    try:
+        yield warningcounts
+    finally:
+        _warningcounts_pool.put(warningcounts)
+
+# Datasets in the wind dataset directory: filename -> WindDataset.listdir()
+# entry (or None, for a dataset which has been requested but not yet seen).
+# "pending" maps the latter to the time they were requested. The "datasets"
+# dict is replaced rather than modified, so callers may iterate over it
+# without holding the lock.
+_dataset_index = {"time": 0, "dir": None, "mtime": None, "datasets": {},
+                  "pending": {}}
+_dataset_index_lock = threading.Lock()
+
+def _get_dataset_index(ds_dir):
+    """
+    Return the index of datasets present in `ds_dir`.
+
+    The dataset directory is only re-scanned when its modification time
+    changes (i.e., a dataset has been added or removed), or at least once
+    every `DATASET_LIST_TTL` seconds in case the change fell within the
+    file system's timestamp resolution. Checking the mtime costs a single
+    stat() per request.
+
+    Datasets registered with `_register_dataset` stay in the index while
+    they are downloaded (which itself changes the mtime), until they appear
+    in the directory or `DATASET_DOWNLOAD_TTL` seconds have passed.
+
+    The index returned mustn't be modified.
+    """
+    try:
+        mtime = os.stat(ds_dir).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    now = time.time()
+    with _dataset_index_lock:
+        if ds_dir != _dataset_index["dir"] or \
+                mtime != _dataset_index["mtime"] or \
+                now - _dataset_index["time"] > DATASET_LIST_TTL:
+            datasets = {ds.filename: ds for ds in WindDataset.listdir(ds_dir)}
+            pending = _dataset_index["pending"]
+            if ds_dir != _dataset_index["dir"]:
+                pending.clear()
+            for filename, requested in list(pending.items()):
+                if filename in datasets or \
+                        now - requested > DATASET_DOWNLOAD_TTL:
+                    pending.pop(filename, None)
+                else:
+                    datasets[filename] = None
+            _dataset_index["datasets"] = datasets
+            _dataset_index["time"] = now
+            _dataset_index["dir"] = ds_dir
+            _dataset_index["mtime"] = mtime
+            _close_deleted_wind_datasets(ds_dir, datasets)
+        return _dataset_index["datasets"]
+
+def _close_deleted_wind_datasets(ds_dir, datasets):
+    """
+    Drop open datasets in `ds_dir` whose files are no longer in `datasets`
+    (i.e., have been deleted by the downloader), so that they are unmapped
+    and their disk space can be freed.
+    """
+    with _wind_datasets_lock:
+        deleted = [key for key in _wind_datasets if key[0] == ds_dir and
+                   datasets.get(key[1].strftime("%Y%m%d%H")) is None]
+        for key in deleted:
+            # As on eviction, Dataset.__del__ closes it once released
+            del _wind_datasets[key]
+
+def _register_dataset(filename, entry=None):
+    """
+    Add `filename` to the dataset index ahead of the next directory scan.
+
+    A placeholder (`entry` of None) is kept across scans until the dataset
+    appears; see `_get_dataset_index`.
+    """
+    with _dataset_index_lock:
+        if entry is None:
+            _dataset_index["pending"][filename] = time.time()
+        datasets = dict(_dataset_index["datasets"])
+        datasets[filename] = entry
+        _dataset_index["datasets"] = datasets
+
+def _invalidate_dataset_index():
+    """
+    Force the next call to `_get_dataset_index` to re-scan the directory.
+    """
+    with _dataset_index_lock:
+        _dataset_index["time"] = 0
 
-    return ruaumoko_ds.once
+# RFC3339 date-times in the form accepted by strict_rfc3339 (ASCII digits only)
+_RFC3339_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})"
+                         r"(\.\d+)?(?:Z|([+-])(\d{2}):(\d{2}))\Z", re.ASCII)
 
 def _rfc3339_to_timestamp(dt):
     """
     Convert from a RFC3339 timestamp to a UNIX timestamp.
+
+    Well-formed timestamps are converted by ciso8601, if it is installed, or
+    otherwise directly; anything that doesn't match `_RFC3339_RE`, or needs
+    further validation, is left to strict_rfc3339 (which also rejects invalid
+    input). ciso8601 is only given timestamps which match, as it accepts more
+    than strict_rfc3339 does (lower case and space separators), and only
+    parses to the microsecond, so the same timestamps are accepted either way.
     """
+    match = _RFC3339_RE.match(dt)
+    if match is not None and ciso8601 is not None:
+        fraction = match.group(7)
+        if fraction is None or len(fraction) <= 7:
+            return ciso8601.parse_rfc3339(dt).timestamp()
+    elif match is not None:
+        year, month, day, hour, minute, second = \
+            [int(x) for x in match.group(1, 2, 3, 4, 5, 6)]
+        fraction, offset_sign, offset_hours, offset_mins = \
+            match.group(7, 8, 9, 10)
+
+        # Days past the 28th depend on the month; let strict_rfc3339
+        # validate those.
+        valid = year >= 1 and 1 <= month <= 12 and 1 <= day <= 28 and \
+                hour <= 23 and minute <= 59 and second <= 59
+        if offset_sign is not None:
+            offset_hours, offset_mins = int(offset_hours), int(offset_mins)
+            valid = valid and offset_hours <= 23 and offset_mins <= 59
+
+        if valid:
+            timestamp = calendar.timegm((year, month, day,
+                                         hour, minute, second))
+            if fraction is not None:
+                timestamp += float("0" + fraction)
+            if offset_sign is not None:
+                offset = offset_hours * 3600 + offset_mins * 60
+                if offset_sign == '-':
+                    offset = -offset
+                timestamp -= offset
+            return timestamp
+
     return strict_rfc3339.rfc3339_to_timestamp(dt)
 
 def _timestamp_to_rfc3339(dt):
     """
     Convert from a UNIX timestamp to a RFC3339 timestamp.
-    """
-    return strict_rfc3339.timestamp_to_rfc3339_utcoffset(dt)
 
-def is_time_between(begin_time, end_time, dt_time):
-    """
-    used to convert conversion to nearest dataset time
+    The output is the same as strict_rfc3339's (rounded to the nearest
+    microsecond, with trailing zeros of the fraction removed), but is
+    formatted by :meth:`datetime.isoformat` rather than in Python, and
+    without strict_rfc3339's check that the result parses back.
     """
-    return begin_time <= dt_time < end_time
-       
+    if dt % 1 == 0:
+        return datetime.utcfromtimestamp(dt).isoformat() + "Z"
 
-def hour_to_nearest_dataset(day, hour):
+    seconds, microseconds = divmod(int(round(dt * 1e6)), 1000000)
+    fraction = "{0:06d}".format(microseconds).rstrip("0")
+    result = datetime.utcfromtimestamp(seconds).isoformat()
+    if fraction:
+        result += "." + fraction
+    return result + "Z"
+
+def _timestamps_to_rfc3339(timestamps):
     """
-    returns nearest dataset time less than the requested hour
-    we do this since the datasets are published and named every 6 hours (00,06,12,18)
+    Convert a list of UNIX timestamps to RFC3339 timestamps.
+
+    If numpy is available the whole seconds are formatted in a single call
+    (which also appends the "Z" suffix, rather than concatenating it to each
+    string in Python); the (rare) fractional timestamps are then formatted
+    individually.
     """
-    hours = [0,6,12,18]
-    end_hours = [6,12,18,24]
-    for i in range(4):
-        if is_time_between(hours[i],end_hours[i], hour):
-           return day, hours[i]
+    if numpy is None:
+        return list(map(_timestamp_to_rfc3339, timestamps))
+
+    seconds = numpy.array(timestamps, dtype=numpy.float64)
+    whole = seconds.astype(numpy.int64)
+    result = numpy.datetime_as_string(whole.astype('datetime64[s]'),
+                                      timezone='UTC').tolist()
+
+    for index in numpy.flatnonzero(whole != seconds).tolist():
+        result[index] = _timestamp_to_rfc3339(timestamps[index])
+
+    return result
+
 # Exceptions ##################################################################
 class APIException(Exception):
     """
@@ -119,6 +606,37 @@ class NotYetImplementedException(APIException):
 
 
 # Request #####################################################################
+def _valid_latitude(x):
+    return -90 <= x <= 90
+
+def _valid_longitude(x):
+    return 0 <= x < 360
+
+def _positive(x):
+    return x > 0
+
+# Required request parameters, as (name, cast, validator): those for all
+# profiles, and those particular to each profile. (Parameters which are
+# validated against other parameters are extracted separately.)
+_GENERIC_FIELDS = (
+    ("launch_latitude", float, _valid_latitude),
+    ("launch_longitude", float, _valid_longitude),
+    ("launch_datetime", _rfc3339_to_timestamp, None),
+)
+_PROFILE_FIELDS = {
+    PROFILE_STANDARD: (
+        ("ascent_rate", float, _positive),
+        ("descent_rate", float, _positive),
+    ),
+    PROFILE_FLOAT: (
+        ("ascent_rate", float, _positive),
+    ),
+}
+
+# Marks a parameter missing from the request in _extract_parameter
+_MISSING = object()
+
+
 def parse_prediction_request(data):
     """
     Parse the request.
@@ -126,25 +644,23 @@ def parse_prediction_request(data):
     req = {"version": API_VERSION}
 
     # Generic fields
-    req['launch_latitude'] = \
-        _extract_parameter(data, "launch_latitude", float,
-                           validator=lambda x: -90 <= x <= 90)
-    req['launch_longitude'] = \
-        _extract_parameter(data, "launch_longitude", float,
-                           validator=lambda x: 0 <= x < 360)
-    req['launch_datetime'] = \
-        _extract_parameter(data, "launch_datetime", _rfc3339_to_timestamp)
+    for name, cast, validator in _GENERIC_FIELDS:
+        req[name] = _extract_parameter(data, name, cast, validator=validator)
     req['launch_altitude'] = \
         _extract_parameter(data, "launch_altitude", float, ignore=True)
 
     # If no launch altitude provided, use Ruaumoko to look it up
     if req['launch_altitude'] is None:
         try:
-            req['launch_altitude'] = ruaumoko_ds().get(req['launch_latitude'],
-                                                       req['launch_longitude'])
-        except Exception:
+            req['launch_altitude'] = _elevation_lookup(
+                round(req['launch_latitude'], ELEVATION_CACHE_PRECISION),
+                round(req['launch_longitude'], ELEVATION_CACHE_PRECISION))
+        except Exception as e:
+            # Don't hide the cause (e.g. a missing elevation dataset) from
+            # the logs, only from the response.
+            app.logger.exception("Unable to look up launch altitude")
             raise InternalException("Internal exception experienced whilst " +
-                                    "looking up 'launch_altitude'.")
+                                    "looking up 'launch_altitude'.") from e
 
     # Prediction profile
     req['profile'] = _extract_parameter(data, "profile", str,
@@ -152,25 +668,23 @@ def parse_prediction_request(data):
 
     launch_alt = req["launch_altitude"]
 
+    profile_fields = _PROFILE_FIELDS.get(req['profile'])
+    if profile_fields is None:
+        raise RequestException("Unknown profile '%s'." % req['profile'])
+    for name, cast, validator in profile_fields:
+        req[name] = _extract_parameter(data, name, cast, validator=validator)
+
     if req['profile'] == PROFILE_STANDARD:
-        req['ascent_rate'] = _extract_parameter(data, "ascent_rate", float,
-                                                validator=lambda x: x > 0)
         req['burst_altitude'] = \
             _extract_parameter(data, "burst_altitude", float,
-                               validator=lambda x: x > launch_alt)
-        req['descent_rate'] = _extract_parameter(data, "descent_rate", float,
-                                                 validator=lambda x: x > 0)
+                               greater_than=launch_alt)
     elif req['profile'] == PROFILE_FLOAT:
-        req['ascent_rate'] = _extract_parameter(data, "ascent_rate", float,
-                                                validator=lambda x: x > 0)
         req['float_altitude'] = \
             _extract_parameter(data, "float_altitude", float,
-                               validator=lambda x: x > launch_alt)
+                               greater_than=launch_alt)
         req['stop_datetime'] = \
             _extract_parameter(data, "stop_datetime", _rfc3339_to_timestamp,
-                               validator=lambda x: x > req['launch_datetime'])
-    else:
-        raise RequestException("Unknown profile '%s'." % req['profile'])
+                               greater_than=req['launch_datetime'])
 
     # Dataset
     req['dataset'] = _extract_parameter(data, "dataset", _rfc3339_to_timestamp,
@@ -181,7 +695,10 @@ def parse_request(data):
     request_type = _get_request_type(data)
     
     if request_type == "prediction":
-        return run_prediction(parse_prediction_request(data))
+        chunks, g.prediction_etag = \
+            _cached_prediction(parse_prediction_request(data),
+                               request.if_none_match)
+        return chunks
     elif request_type == "load_datasets":
         return _get_present_datasets(data)
     else:
@@ -189,57 +706,64 @@ def parse_request(data):
             
     
 def _get_request_type(data):
-    req_type = _extract_parameter(data, "type", str)
+    """
+    In order to remain compatible with old version of QGIS plugin, the default
+    type is "prediction" as that's the old (implicit) request form.
+    """
+    req_type = _extract_parameter(data, "type", str, "prediction")
     return req_type
 
 
-def _extract_parameter(data, parameter, cast, default="prediction", ignore=False,
-                       validator=None):
+def _extract_parameter(data, parameter, cast, default=None, ignore=False,
+                       validator=None, greater_than=None):
     """
     Extract a parameter from the POST request and raise an exception if any
     parameter is missing or invalid.
 
-    In order to remain compatible with old version of QGIS plugin, the default is set to "prediction" as that's the old default. And it'll check to make sure _extract_parameter("launch_latitude") returns something to make sure it's the antiquated
-    request form taking place.
+    Parameters which must be greater than another (e.g., the burst altitude
+    than the launch altitude) give it as `greater_than`, rather than as a
+    validator closing over it.
     """
-    if parameter not in data:
+    value = data.get(parameter, _MISSING)
+    if value is _MISSING:
         if default is None and not ignore:
             raise RequestException("Parameter '%s' not provided in request." %
                                    parameter)
         return default
 
     try:
-        result = cast(data[parameter])
+        result = cast(value)
     except Exception:
         raise RequestException("Unable to parse parameter '%s': %s." %
-                               (parameter, data[parameter]))
+                               (parameter, value))
 
-    if validator is not None and not validator(result):
+    if (validator is not None and not validator(result)) or \
+            (greater_than is not None and not result > greater_than):
         raise RequestException("Invalid value for parameter '%s': %s." %
-                               (parameter, data[parameter]))
+                               (parameter, value))
 
     return result
 
 
 def _get_present_datasets(req):
     """
-    uses listdir() function from WindDataset to build and return a list of present datasets
+    uses the dataset index (see _get_dataset_index) to build and return a list of present datasets
     """
-    datasets = []
     #To Do:
     #could implement some verification here
-    for stuff in WindDataset.listdir():
-        datasets.append(stuff)
+    datasets = [ds for ds in _get_dataset_index(_config().wind_dataset_dir).values()
+                if ds is not None]
     resp = {
-        "request": req,
+        # a plain dict of the (first) values, as req may be a MultiDict
+        "request": dict(req),
         "datasets": datasets,
     }
     
     return resp
 
-def _is_old_dataset(req):
+def _is_old_dataset(req, ds_dir):
     """
-    if dataset name is found in the default directory ("tawhiri_datasets" folder)
+    if dataset name is found in ds_dir (the "tawhiri_datasets" folder)
     we still need to change req['dataset'] because we might still be working with an old file that is already downloaded by a previous run. so it's not ok to just use latest
     
     
@@ -250,37 +774,36 @@ def _is_old_dataset(req):
 
     #check here if it's a prediction for the future
 
-    current_time = datetime.now()
+    current_time = datetime.utcnow()
     max_time = current_time + timedelta(hours=180)
     if current_time <= launch_dataset_time < max_time:
         return False
     
-    #list dir yields a namedtuple with the suffix field which is the first 10 characters of a file name. aka the file name
-    #
-    for stuff in WindDataset.listdir():
-        if dataset_name == stuff.filename:
-            req['dataset'] = launch_dataset_time#we might still not want to use latest.
-            return False
-        
-    req['dataset'] = launch_dataset_time
-    return True
+    req['dataset'] = launch_dataset_time#we might still not want to use latest.
+    return dataset_name not in _get_dataset_index(ds_dir)
     
-def _date_to_dataset_name(rcf_launch_time):
+def _date_to_dataset_name(launch_timestamp):
     """
-    converts req["launch_datetime"] to string of YYYYMMDDHH since that's how the dataset files are named in "tawhiri_datasets"
+    converts req["launch_datetime"] (already a UNIX timestamp) to string of YYYYMMDDHH since that's how the dataset files are named in "tawhiri_datasets"
     need to convert to nearest hours that data is collected
     returns filename as will be found in directory and launch_date_time which will be attributed to launch dataset time which is the time of the dataset which will be downloaded
     """
     
-    #need to be careful here to convert the hour to the closest dataset, 00, 06, 12, 18
-    
-    launch_date_time = datetime.fromtimestamp(rcf_launch_time)
-    #changing hour to nearest dataset
-    dataset_day, dataset_hour = hour_to_nearest_dataset(launch_date_time.day, launch_date_time.hour)
-    launch_date_time = launch_date_time.replace(day = dataset_day, hour = dataset_hour, minute = 0, second = 0, microsecond = 0)#replace does not work in place
-    filename = launch_date_time.strftime("%Y%m%d%H")
+    #datasets are published and named every 6 hours (00,06,12,18 UTC), so the launch's dataset is found by
+    #rounding the timestamp down to a multiple of 6 hours. every launch in the same 6 hours maps to the same
+    #dataset, so only work the name out once per dataset
+    return _period_to_dataset_name(int(launch_timestamp // DATASET_PERIOD))
 
-    return filename, launch_date_time
+@lru_cache(maxsize=4096)
+def _period_to_dataset_name(period):
+    """
+    _date_to_dataset_name for the dataset `period`, in multiples of DATASET_PERIOD since the UNIX epoch
+    """
+    #dataset files are named in UTC, so don't use the local timezone here
+    t = time.gmtime(period * DATASET_PERIOD)
+    filename = f"{t.tm_year:04d}{t.tm_mon:02d}{t.tm_mday:02d}{t.tm_hour:02d}"
+
+    return filename, datetime(t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour)
 
 def _download_old_dataset(launch_datetime):
     """
@@ -296,18 +819,27 @@ def _download_old_dataset(launch_datetime):
     exclusion_script_path = '/srv/deletion_exclusion_list/' + datasetname
     touch_file(exclusion_script_path)
 
+    # Don't ask for the dataset again while it is being downloaded; it will
+    # be picked up properly by the next scan of the directory.
+    _register_dataset(datasetname)
+
     
     
     return
     
 def touch_file(file_path):
+    """
+    create file_path if it doesn't exist, and update its times if it does (like touch(1))
+    """
     try:
-        #openfile in write mode so file is created if it doesn't exist
-        with open(file_path, 'w'):
-            pass#leave file empty
-        print(f"Empty file created: {file_path}")
-    except Exception as e:
-        print(f"an error occured: {e}")
+        #create the file without truncating or buffering it; it's only a marker for inotify
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_CLOEXEC, 0o644)
+        os.close(fd)
+        #an existing file isn't modified by the open, so bump its times to raise an inotify event
+        os.utime(file_path, None)
+        app.logger.debug("Touched file: %s", file_path)
+    except OSError:
+        app.logger.warning("Unable to touch file: %s", file_path, exc_info=True)
               
 
 # Response ####################################################################
@@ -315,33 +847,22 @@ def run_prediction(req):
     """
     Run the prediction.
     """
-    #run this first since it modifies response dict:
-    #req['dataset_time'] is a parameter I added to the req dict. It's the prediction time requested converted to the nearest dataset time.
-    #without this conversion, _download_old_dataset wont work as it'll be looking for a dataset named after whichever time is passed in.
-    if _is_old_dataset(req):
-        _download_old_dataset(req['dataset_time'])
-
-
     # Response dict
     resp = {
         "request": req,
         "prediction": [],
     }
 
-    warningcounts = WarningCounts()
-
     # Find wind data location
-    ds_dir = app.config.get('WIND_DATASET_DIR', WindDataset.DEFAULT_DIRECTORY)
-    
+    ds_dir = _config().wind_dataset_dir
+
     # Dataset
-    # with the added feature of being able to download and access old datasets, req['dataset'] will never equal LATEST_DATASET_KEYWORD
-    # with the original implementation it was the opposite case. it was always the first if that was triggered since datasets were never passed in as far as I know
-    # and parse_request() would set req['dataset'] to LATEST_DATASET_KEYWORD
+    # _resolve_dataset runs _is_old_dataset first since it modifies the req dict:
+    # req['dataset_time'] is the prediction time requested converted to the nearest dataset time, which
+    # _download_old_dataset needs. For old launches req['dataset'] is set to that time, so it only
+    # stays LATEST_DATASET_KEYWORD for predictions into the future.
     try:
-        if req['dataset'] == LATEST_DATASET_KEYWORD:
-            tawhiri_ds = WindDataset.open_latest(persistent=True, directory=ds_dir)
-        else:
-            tawhiri_ds = WindDataset(req['dataset'], directory=ds_dir)
+        tawhiri_ds = _resolve_dataset(req, ds_dir)
     except IOError:
         raise InvalidDatasetException("No matching dataset found.")
     except ValueError as e:
@@ -351,6 +872,139 @@ def run_prediction(req):
     resp['request']['dataset'] = \
             tawhiri_ds.ds_time.strftime("%Y-%m-%dT%H:00:00Z")
 
+    # Run solver
+    pool = _get_prediction_pool()
+    if pool is None:
+        with _checkout_warningcounts() as warningcounts:
+            result = _solve(req, tawhiri_ds, warningcounts)
+            warnings = warningcounts.to_dict()
+    else:
+        pool, future = _submit_prediction(pool, req, tawhiri_ds.ds_time)
+        try:
+            result, warnings = future.result(timeout=PREDICTION_TIMEOUT)
+        except FutureTimeoutError:
+            # The prediction can't be stopped, and would hold up those queued
+            # behind it, so send subsequent predictions to a new pool.
+            if not future.cancel():
+                _discard_prediction_pool(pool)
+            raise PredictionException("Prediction did not complete in time.")
+        except BrokenProcessPool:
+            _discard_prediction_pool(pool)
+            raise PredictionException("Prediction process failed.")
+
+    # Format trajectory
+    if req['profile'] == PROFILE_STANDARD:
+        resp['prediction'] = _parse_stages(["ascent", "descent"], result)
+    elif req['profile'] == PROFILE_FLOAT:
+        resp['prediction'] = _parse_stages(["ascent", "float"], result)
+    else:
+        raise InternalException("No implementation for known profile.")
+
+    # Convert request UNIX timestamps to RFC3339 timestamps
+    for key in _DATETIME_KEYS:
+        value = req.get(key)
+        if value is not None:
+            req[key] = _timestamp_to_rfc3339(value)
+
+    resp["warnings"] = warnings
+
+    return resp
+
+# Serialised prediction responses by request; see _cached_prediction()
+_predictions = OrderedDict()
+_predictions_size = 0
+_predictions_lock = threading.Lock()
+
+def _prediction_cache_key(req):
+    """
+    Return a key identifying the prediction requested by the (parsed, but not
+    yet run) request `req`.
+
+    Predictions are deterministic given the request and dataset, so this is
+    a hash of the request; for the latest dataset it includes the dataset's
+    time, so that responses aren't re-used once a newer one arrives.
+    """
+    key = sorted(req.items())
+    if req['dataset'] == LATEST_DATASET_KEYWORD:
+        latest = _latest_dataset_time(_config().wind_dataset_dir)
+        key.append(("latest", latest.isoformat()))
+    return hashlib.blake2b(_json_dumps(key), digest_size=16).hexdigest()
+
+def _cached_prediction(req, etags=None):
+    """
+    Run the prediction for `req`, re-using the response to an identical
+    request made in the last `PREDICTION_CACHE_TTL` seconds.
+
+    Returns the response serialised as JSON, as an iterable of bytes, and its
+    cache key (or ``None`` if it couldn't be cached). A new response is
+    serialised as it is read (see `_stream_prediction`), and cached once it
+    has been read in full.
+
+    If the key is in `etags` (the request's If-None-Match header) the client
+    has the response already, so it isn't run (or looked up) at all, and
+    the response is empty.
+    """
+    try:
+        key = _prediction_cache_key(req)
+    except IOError:
+        # No datasets to pick the latest from; let run_prediction report it
+        return _stream_prediction(run_prediction(req)), None
+
+    if etags is not None and etags.contains_weak(key):
+        # main() responds with 304 Not Modified
+        return [], key
+
+    now = time.monotonic()
+    with _predictions_lock:
+        entry = _predictions.get(key)
+        if entry is not None and now - entry[0] < PREDICTION_CACHE_TTL:
+            _predictions.move_to_end(key)
+            return [entry[1]], key
+
+    resp = run_prediction(req)
+    return _cache_prediction(key, now, _stream_prediction(resp)), key
+
+def _cache_prediction(key, now, chunks):
+    """
+    Yield the serialised response `chunks`, then cache the whole response
+    under `key`.
+
+    Responses are cached as bytes, which take a fraction of the memory of
+    the response dict, and needn't be serialised again.
+    """
+    global _predictions_size
+
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    body = b''.join(body)
+
+    with _predictions_lock:
+        entry = _predictions.pop(key, None)
+        if entry is not None:
+            _predictions_size -= len(entry[1])
+        _predictions[key] = (now, body)
+        _predictions_size += len(body)
+        while len(_predictions) > PREDICTION_CACHE_SIZE or \
+                _predictions_size > PREDICTION_CACHE_BYTES:
+            _, (_, evicted) = _predictions.popitem(last=False)
+            _predictions_size -= len(evicted)
+
+def _clear_predictions():
+    """
+    Drop all cached prediction responses.
+    """
+    global _predictions_size
+
+    with _predictions_lock:
+        _predictions.clear()
+        _predictions_size = 0
+
+def _solve(req, tawhiri_ds, warningcounts):
+    """
+    Build the stages of the profile requested by `req` and run the solver.
+    """
     # Stages
     if req['profile'] == PROFILE_STANDARD:
         stages = models.standard_profile(req['ascent_rate'],
@@ -383,22 +1037,27 @@ def run_prediction(req):
         raise PredictionException("Prediction did not complete: '%s'." %
                                   str(e))
 
-    # Format trajectory
-    if req['profile'] == PROFILE_STANDARD:
-        resp['prediction'] = _parse_stages(["ascent", "descent"], result)
-    elif req['profile'] == PROFILE_FLOAT:
-        resp['prediction'] = _parse_stages(["ascent", "float"], result)
-    else:
-        raise InternalException("No implementation for known profile.")
-
-    # Convert request UNIX timestamps to RFC3339 timestamps
-    for key in resp['request']:
-        if "datetime" in key:
-            resp['request'][key] = _timestamp_to_rfc3339(resp['request'][key])
+    return result
 
-    resp["warnings"] = warningcounts.to_dict()
+def _solve_in_process(req, ds_time):
+    """
+    Run `_solve` in a prediction pool process.
 
-    return resp
+    The stages hold closures over the datasets, so can't be sent between
+    processes; instead they are built here, using this process's own
+    (cached) datasets. Returns the solver result and the warnings.
+    """
+    ds_dir = _config().wind_dataset_dir
+    try:
+        # Refresh the index, so that this process too closes datasets which
+        # have since been deleted (see _close_deleted_wind_datasets)
+        _get_dataset_index(ds_dir)
+        tawhiri_ds = _get_wind_dataset(ds_time, ds_dir)
+    except IOError:
+        raise InvalidDatasetException("No matching dataset found.")
+    with _checkout_warningcounts() as warningcounts:
+        result = _solve(req, tawhiri_ds, warningcounts)
+        return result, warningcounts.to_dict()
 
 
 def _parse_stages(labels, data):
@@ -411,12 +1070,18 @@ def _parse_stages(labels, data):
     for index, leg in enumerate(data):
         stage = {}
         stage['stage'] = labels[index]
+        # Format all of the leg's timestamps in one pass before building the
+        # trajectory points. (The dict literal below, with its constant keys,
+        # is already the cheapest way to build each point in CPython. Slotted
+        # dataclasses use less memory, but orjson serialises them several
+        # times more slowly than dicts, which costs more than it saves.)
+        datetimes = _timestamps_to_rfc3339([point[0] for point in leg])
         stage['trajectory'] = [{
             'latitude': lat,
             'longitude': lon,
             'altitude': alt,
-            'datetime': _timestamp_to_rfc3339(dt),
-            } for dt, lat, lon, alt in leg]
+            'datetime': dt,
+            } for (_, lat, lon, alt), dt in zip(leg, datetimes)]
         prediction.append(stage)
     return prediction
 
@@ -427,15 +1092,162 @@ def main():
     Single API endpoint which accepts GET requests.
     """
     g.request_start_time = time.time()
+    g.request_start_counter = time.perf_counter_ns()
 
     response = parse_request(request.args)
     
     #run prediction returns resp in a specific way. need to mimic it with load_datasets
 
     #response = run_prediction(parse_prediction_request(request.args))
-    g.request_complete_time = time.time()
+    g.request_complete_counter = time.perf_counter_ns()
     #response['metadata'] = _format_request_metadata()
-    return jsonify(response)
+    if not isinstance(response, (dict, str)):
+        # A prediction, serialised as JSON (see _cached_prediction)
+        resp = Response(stream_with_context(response),
+                        mimetype='application/json')
+        # Identical requests get identical responses (see _cached_prediction),
+        # so let browsers and proxies cache them too.
+        etag = g.get('prediction_etag')
+        if etag is not None:
+            resp.set_etag(etag)
+            resp.cache_control.public = True
+            resp.cache_control.max_age = PREDICTION_CACHE_TTL
+            resp = resp.make_conditional(request)
+        return resp
+    return _json_response(response)
+
+
+def _json_dumps(obj):
+    """
+    Serialise `obj` as JSON, as bytes.
+
+    orjson (if installed) produces bytes directly, so this avoids decoding
+    its output only for it to be encoded again in the response.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=OrjsonProvider.default,
+                            option=OrjsonProvider.option)
+    return json.dumps(obj).encode()
+
+def _json_response(obj, status=200):
+    """
+    Return a JSON response containing `obj`.
+    """
+    return app.response_class(_json_dumps(obj), status=status,
+                              mimetype='application/json')
+
+def _stream_prediction(resp):
+    """
+    Serialise the prediction response `resp` as JSON a piece at a time, so
+    that long trajectories are sent as they are serialised rather than
+    being built into a single string first.
+    """
+    header = {key: value for key, value in resp.items() if key != 'prediction'}
+    # header is never empty (it always contains the request), so drop its
+    # closing brace and append the prediction.
+    yield _json_dumps(header)[:-1] + b',"prediction":['
+
+    for index, stage in enumerate(resp['prediction']):
+        yield b'%s{"stage":%s,"trajectory":[' % (
+                b',' if index else b'', _json_dumps(stage['stage']))
+
+        trajectory = stage['trajectory']
+        for start in range(0, len(trajectory), STREAM_CHUNK_POINTS):
+            points = trajectory[start:start + STREAM_CHUNK_POINTS]
+            yield (b',' if start else b'') + _json_dumps(points)[1:-1]
+
+        yield b']}'
+
+    yield b']}'
+
+
+@app.route('/api/v{0}/batch'.format(API_VERSION), methods=['POST'])
+def batch():
+    """
+    Endpoint which runs several predictions, given as a JSON list in the
+    body of a POST request, in one go.
+
+    Each prediction accepts the same parameters as the GET endpoint. Results
+    are returned in the same order as the predictions; one that fails has an
+    error fragment in place of its response, rather than failing the batch.
+    If a prediction pool is configured, the predictions are run in parallel.
+    """
+    g.request_start_time = time.time()
+    g.request_start_counter = time.perf_counter_ns()
+
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or \
+            not isinstance(body.get("predictions"), list):
+        raise RequestException("Request body must be a JSON object with a "
+                               "list of 'predictions'.")
+
+    predictions = body["predictions"]
+    max_batch_size = _config().max_batch_size
+    if len(predictions) > max_batch_size:
+        raise RequestException("At most %d predictions may be made per batch."
+                               % max_batch_size)
+
+    # Each result is serialised as JSON
+    results = [None] * len(predictions)
+    reqs = []
+    for index, data in enumerate(predictions):
+        try:
+            if not isinstance(data, dict):
+                raise RequestException("Prediction must be a JSON object.")
+            reqs.append((index, parse_prediction_request(data)))
+        except APIException as e:
+            results[index] = _json_dumps(_format_error(e))
+
+    # Run the predictions for each dataset together, so that each dataset is
+    # opened (or found in the cache) once rather than being evicted and
+    # re-opened between predictions.
+    reqs.sort(key=lambda item: _date_to_dataset_name(
+                                    item[1]['launch_datetime'])[0])
+
+    def predict(req):
+        try:
+            return b''.join(_cached_prediction(req)[0])
+        except APIException as e:
+            return _json_dumps(_format_error(e))
+
+    def predict_in_thread(req):
+        with app.app_context():
+            return predict(req)
+
+    batch_reqs = [req for _, req in reqs]
+    if _get_prediction_pool() is None:
+        responses = map(predict, batch_reqs)
+    else:
+        # Submit every prediction to the pool before waiting on any, so that
+        # all of its processes are kept busy, by running each from a thread.
+        with ThreadPoolExecutor(
+                max_workers=_config().prediction_processes) as executor:
+            responses = list(executor.map(predict_in_thread, batch_reqs))
+    for (index, _), response in zip(reqs, responses):
+        results[index] = response
+
+    g.request_complete_counter = time.perf_counter_ns()
+    body = b'{"results":[%s],"metadata":%s}' % (
+        b','.join(results), _json_dumps(_format_request_metadata()))
+    return app.response_class(body, mimetype='application/json')
+
+
+@app.route('/api/v{0}/admin/clear_cache'.format(API_VERSION), methods=['POST'])
+def clear_cache():
+    """
+    Drop memoised lookups and re-open the elevation dataset on next use, e.g.
+    after it has been replaced.
+
+    Only served if the ``ADMIN_API`` setting is enabled.
+    """
+    if not _config().admin_api:
+        raise NotFound()
+
+    ruaumoko_ds.cache_clear()
+    _elevation_lookup.cache_clear()
+    _invalidate_dataset_index()
+    _clear_predictions()
+    return _json_response({"cleared": True})
 
 
 @app.errorhandler(APIException)
@@ -443,21 +1255,34 @@ def handle_exception(error):
     """
     Return correct error message and HTTP status code for API exceptions.
     """
-    response = {}
-    response['error'] = {
-        "type": type(error).__name__,
-        "description": str(error)
-    }
-    g.request_complete_time = time.time()
+    response = _format_error(error)
+    g.request_complete_counter = time.perf_counter_ns()
     response['metadata'] = _format_request_metadata()
-    return jsonify(response), error.status_code
+    return _json_response(response, error.status_code)
+
+
+def _format_error(error):
+    """
+    Format the API exception `error` as an error fragment.
+    """
+    return {
+        "error": {
+            "type": type(error).__name__,
+            "description": str(error)
+        }
+    }
 
 
 def _format_request_metadata():
     """
     Format the request metadata for inclusion in the response.
     """
+    # The duration is measured with a monotonic clock, so it is unaffected
+    # by adjustments to the system time during the request.
+    duration_ns = g.request_complete_counter - g.request_start_counter
     return {
         "start_datetime": _timestamp_to_rfc3339(g.request_start_time),
-        "complete_datetime": _timestamp_to_rfc3339(g.request_complete_time),
+        "complete_datetime":
+            _timestamp_to_rfc3339(g.request_start_time + duration_ns / 1e9),
+        "duration_ms": duration_ns / 1e6,
     }
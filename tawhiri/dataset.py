@@ -154,24 +154,34 @@ class Dataset(object):
         added second 2 iffs so that datasets that are currently being downloaded(prefixed with download-) would be returned
         """
 
-        for filename in os.listdir(directory):
-            if len(filename) < 10:
-                continue
-            if len(filename) == 10:
-                ds_time_str = filename[:10]
-            if len(filename) > 10:
-                ds_time_str = filename[-10:] 
-            try:
-                ds_time = datetime.strptime(ds_time_str, "%Y%m%d%H")
-            except ValueError:
-                pass
-            else:
-                suffix = filename[10:]
-                if only_suffices and suffix not in only_suffices:
+        # os.scandir gives us each entry's path without joining it ourselves
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                filename = entry.name
+                if len(filename) < 10:
                     continue
-
-                yield cls._listdir_type(ds_time, suffix, filename,
-                                        os.path.join(directory, filename))
+                if len(filename) == 10:
+                    ds_time_str = filename[:10]
+                if len(filename) > 10:
+                    ds_time_str = filename[-10:]
+                # Equivalent to strptime(ds_time_str, "%Y%m%d%H"), but
+                # without parsing the format string for every file
+                if not (ds_time_str.isascii() and ds_time_str.isdigit()):
+                    continue
+                try:
+                    ds_time = datetime(int(ds_time_str[0:4]),
+                                       int(ds_time_str[4:6]),
+                                       int(ds_time_str[6:8]),
+                                       int(ds_time_str[8:10]))
+                except ValueError:
+                    pass
+                else:
+                    suffix = filename[10:]
+                    if only_suffices and suffix not in only_suffices:
+                        continue
+
+                    yield cls._listdir_type(ds_time, suffix, filename,
+                                            entry.path)
 
 
     cached_latest = None
@@ -21,13 +21,15 @@ Command-line manager for API webapp
 import os
 from flask import send_file, send_from_directory, redirect, url_for
 from flask.ext.script import Manager
-from .api import app
+from .api import app, init_app
 manager = Manager(app)
 
 def main():
     if 'TAWHIRI_SETTINGS' in os.environ:
         app.config.from_envvar('TAWHIRI_SETTINGS')
 
+    init_app(app)
+
     ui_dir = app.config.get('UI_DIR')
     if ui_dir is not None:
         @app.route('/ui/<path:path>')
@@ -26,6 +26,10 @@ fired, and how many times they have fired.
 
 cdef class WarningCounts:
     def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Clear all of the counts, so that the object may be re-used."""
         self.altitude_too_high = 0
 
     @property
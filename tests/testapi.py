@@ -1,12 +1,24 @@
 from __future__ import print_function
 
+import dataclasses
 import json
+import os
+import signal
+import threading
+import time
+
+import strict_rfc3339
 
 from flask_testing import TestCase
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
 from mock import patch, MagicMock
 from urllib.parse import urlencode
 
+from tawhiri import api
 from tawhiri.api import app
+from tawhiri.dataset import Dataset as WindDataset
 
 # Root path for v1 API
 API_ROOT = '/api/v1/'
@@ -16,6 +28,13 @@ class BasicApiTest(TestCase):
         app.debug = True
         return app
 
+    def setUp(self):
+        api._elevation_lookup.cache_clear()
+        api._wind_datasets.clear()
+        api._invalidate_dataset_index()
+        api._dataset_index["pending"].clear()
+        api._clear_predictions()
+
     def test_root_get(self):
         """Check that simply GET-ing the API root with no parameters results in
         a 400 response and a descriptive JSON body.
@@ -32,6 +51,10 @@ class BasicApiTest(TestCase):
         # Response should have an error description.
         self.assertIn('error', json_body)
 
+        # ... and metadata including how long the request took.
+        self.assertIn('metadata', json_body)
+        self.assertGreaterEqual(json_body['metadata']['duration_ms'], 0)
+
     @patch('tawhiri.models.standard_profile')
     @patch('tawhiri.solver.solve')
     @patch('tawhiri.api.WindDataset')
@@ -53,8 +76,12 @@ class BasicApiTest(TestCase):
         # Mock ruaumoko's elevation API to always return 5m.
         ruaumoko_ds_mock().get = MagicMock(return_value=5)
 
-        # Mock latest dataset's strftime
-        wind_ds_mock.open_latest().ds_time.strftime = MagicMock(return_value='strftime_mock')
+        # Mock the dataset directory, which holds the launch's dataset
+        wind_ds_mock.listdir.return_value = [MagicMock(
+            filename='2014081918', suffix='', ds_time=datetime(2014, 8, 19, 18))]
+
+        # Mock the opened dataset's strftime
+        wind_ds_mock().ds_time.strftime = MagicMock(return_value='strftime_mock')
 
         # Predictions always return the same value
         mock_prediction = [
@@ -93,3 +120,460 @@ class BasicApiTest(TestCase):
             self.assertEqual(len(expected), len(leg['trajectory']))
 
             # TODO: Compare results for equality
+
+    def test_parameters_greater_than(self):
+        """Altitudes and times are checked against the launch's."""
+        data = dict(launch_latitude='52.1', launch_longitude='0.3',
+                    launch_altitude='100', launch_datetime='2014-08-19T23:00:00Z',
+                    ascent_rate='5', descent_rate='10', burst_altitude='30000')
+        self.assertEqual(api.parse_prediction_request(data)['burst_altitude'],
+                         30000)
+        data['burst_altitude'] = '100'
+        with self.assertRaises(api.RequestException):
+            api.parse_prediction_request(data)
+
+        data.update(profile=api.PROFILE_FLOAT, float_altitude='20000',
+                    stop_datetime='2014-08-19T22:00:00Z')
+        with self.assertRaises(api.RequestException):
+            api.parse_prediction_request(data)
+
+    @patch('tawhiri.api.ruaumoko_ds')
+    def test_elevation_lookup_memoised(self, ruaumoko_ds_mock):
+        """Repeat launches from the same site only hit Ruaumoko once."""
+        ruaumoko_ds_mock().get = MagicMock(return_value=5)
+
+        data = dict(launch_latitude='52.10001', launch_longitude='0.3',
+                    launch_datetime='2014-08-19T23:00:00Z', ascent_rate='5',
+                    descent_rate='10', burst_altitude='30000')
+        for _ in range(3):
+            req = api.parse_prediction_request(data)
+            self.assertEqual(req['launch_altitude'], 5)
+
+        ruaumoko_ds_mock().get.assert_called_once_with(52.1, 0.3)
+
+        # The admin endpoint is disabled by default...
+        response = self.client.post(API_ROOT + 'admin/clear_cache')
+        self.assert404(response)
+        api.parse_prediction_request(data)
+        self.assertEqual(ruaumoko_ds_mock().get.call_count, 1)
+
+        # ... but once enabled, clearing the cache re-opens the dataset and
+        # forces a fresh lookup
+        config = api._config()
+        app.extensions['tawhiri'] = dataclasses.replace(config, admin_api=True)
+        try:
+            response = self.client.post(API_ROOT + 'admin/clear_cache')
+        finally:
+            app.extensions['tawhiri'] = config
+        self.assert200(response)
+        ruaumoko_ds_mock.cache_clear.assert_called_once_with()
+        api.parse_prediction_request(data)
+        self.assertEqual(ruaumoko_ds_mock().get.call_count, 2)
+
+    @patch('tawhiri.api.ElevationDataset')
+    def test_ruaumoko_ds_opened_once(self, elevation_ds_mock):
+        """The elevation dataset is opened once and then re-used."""
+        api.ruaumoko_ds.cache_clear()
+        try:
+            first = api.ruaumoko_ds()
+            self.assertIs(api.ruaumoko_ds(), first)
+            self.assertEqual(elevation_ds_mock.call_count, 1)
+        finally:
+            api.ruaumoko_ds.cache_clear()
+
+    @patch('tawhiri.api.WindDataset')
+    def test_wind_dataset_cache(self, wind_ds_mock):
+        """Explicitly requested datasets are opened once and kept in an LRU."""
+        wind_ds_mock.side_effect = lambda ds_time, directory: MagicMock()
+
+        first = api._get_wind_dataset(0, '/ds')
+        self.assertIs(api._get_wind_dataset(0, '/ds'), first)
+        self.assertEqual(wind_ds_mock.call_count, 1)
+
+        for i in range(1, api.WIND_DATASET_CACHE_SIZE + 1):
+            api._get_wind_dataset(i, '/ds')
+        self.assertEqual(len(api._wind_datasets), api.WIND_DATASET_CACHE_SIZE)
+        self.assertNotIn(('/ds', 0), api._wind_datasets)
+
+    @patch('tawhiri.api.WindDataset')
+    @patch('tawhiri.api.ElevationDataset')
+    def test_init_app(self, elevation_ds_mock, wind_ds_mock):
+        """init_app opens the datasets, and tolerates them being missing."""
+        api.ruaumoko_ds.cache_clear()
+        wind_ds_mock.listdir.return_value = [
+            MagicMock(suffix='', ds_time=datetime(2014, 8, 19, 12)),
+            MagicMock(suffix='', ds_time=datetime(2014, 8, 19, 18)),
+            MagicMock(suffix='.gribmirror', ds_time=datetime(2014, 8, 20, 0)),
+        ]
+        wind_ds_mock.side_effect = IOError
+        try:
+            api.init_app(app)
+            self.assertEqual(elevation_ds_mock.call_count, 1)
+            wind_ds_mock.assert_called_with(
+                datetime(2014, 8, 19, 18),
+                directory=api._config().wind_dataset_dir)
+        finally:
+            api.ruaumoko_ds.cache_clear()
+
+    @patch('tawhiri.api.os.stat')
+    @patch('tawhiri.api.touch_file')
+    @patch('tawhiri.api.WindDataset')
+    def test_dataset_index(self, wind_ds_mock, touch_file_mock, stat_mock):
+        """Old datasets are looked up in an index, not the directory."""
+        present = MagicMock(filename='2014081918')
+        wind_ds_mock.listdir.return_value = [present]
+        stat_mock.return_value = MagicMock(st_mtime_ns=1)
+
+        req = {'launch_datetime': 1408489200} # 2014-08-19T23:00:00Z
+        self.assertFalse(api._is_old_dataset(req, '/ds'))
+        req = {'launch_datetime': 1408510800} # 2014-08-20T05:00:00Z
+        self.assertTrue(api._is_old_dataset(req, '/ds'))
+
+        # Requesting a download registers the dataset, so it isn't
+        # requested again before the next directory scan.
+        index = api._get_dataset_index('/ds')
+        api._download_old_dataset(req['dataset_time'])
+        self.assertFalse(api._is_old_dataset(req, '/ds'))
+        self.assertEqual(wind_ds_mock.listdir.call_count, 1)
+
+        # (The index is replaced, not modified, as other threads may be
+        # iterating over it.)
+        self.assertNotIn('2014082000', index)
+
+        # Nor while it is being downloaded (which changes the mtime)...
+        stat_mock.return_value = MagicMock(st_mtime_ns=2)
+        self.assertFalse(api._is_old_dataset(req, '/ds'))
+        self.assertEqual(wind_ds_mock.listdir.call_count, 2)
+
+        # ...but it may be once the download has timed out.
+        with patch('tawhiri.api.time.time', return_value=time.time() +
+                   api.DATASET_DOWNLOAD_TTL + 1):
+            api._invalidate_dataset_index()
+            self.assertTrue(api._is_old_dataset(req, '/ds'))
+
+    @patch('tawhiri.api.WindDataset')
+    def test_deleted_wind_datasets_closed(self, wind_ds_mock):
+        """Open datasets are dropped once their files have been deleted."""
+        wind_ds_mock.side_effect = lambda ds_time, directory: MagicMock()
+        old, new = datetime(2014, 8, 19, 12), datetime(2014, 8, 19, 18)
+        wind_ds_mock.listdir.return_value = [
+            MagicMock(filename='2014081912', suffix='', ds_time=old),
+            MagicMock(filename='2014081918', suffix='', ds_time=new),
+        ]
+        api._get_wind_dataset(old, '/ds')
+        api._get_wind_dataset(new, '/ds')
+        api._get_dataset_index('/ds')
+        self.assertEqual(len(api._wind_datasets), 2)
+
+        wind_ds_mock.listdir.return_value = \
+            wind_ds_mock.listdir.return_value[1:]
+        api._invalidate_dataset_index()
+        api._get_dataset_index('/ds')
+        self.assertEqual(list(api._wind_datasets), [('/ds', new)])
+
+    @patch('tawhiri.api.os.stat')
+    @patch('tawhiri.api.WindDataset')
+    def test_dataset_index_mtime(self, wind_ds_mock, stat_mock):
+        """The dataset directory is re-scanned when its mtime changes."""
+        wind_ds_mock.listdir.return_value = []
+        stat_mock.return_value = MagicMock(st_mtime_ns=1)
+        api._get_dataset_index('/ds')
+        api._get_dataset_index('/ds')
+        self.assertEqual(wind_ds_mock.listdir.call_count, 1)
+
+        stat_mock.return_value = MagicMock(st_mtime_ns=2)
+        api._get_dataset_index('/ds')
+        self.assertEqual(wind_ds_mock.listdir.call_count, 2)
+
+    @patch('tawhiri.api._get_dataset_index')
+    @patch('tawhiri.api._get_wind_dataset')
+    @patch('tawhiri.api._resolve_dataset')
+    @patch('tawhiri.api._solve')
+    def test_prediction_pool(self, solve_mock, resolve_mock, wind_ds_mock,
+                             index_mock):
+        """Predictions may be run in a pool, building the stages there."""
+        def solve(req, tawhiri_ds, warningcounts):
+            warningcounts.altitude_too_high += 1
+            return [[(1, 52, 0, 0)], [(2, 53, 0, 0)]]
+        solve_mock.side_effect = solve
+        resolve_mock().ds_time = datetime(2014, 8, 19, 18)
+        req = dict(profile=api.PROFILE_STANDARD, launch_datetime=1408489200)
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            with patch('tawhiri.api._get_prediction_pool',
+                       return_value=pool):
+                resp = api.run_prediction(dict(req))
+
+        self.assertEqual(resp['prediction'][0]['trajectory'][0]['latitude'], 52)
+        # Warnings are counted in the pool and returned with the result
+        self.assertEqual(resp['warnings']['altitude_too_high']['count'], 1)
+        wind_ds_mock.assert_called_with(datetime(2014, 8, 19, 18),
+                                        api._config().wind_dataset_dir)
+        # ... which also drops any of its datasets which have been deleted
+        index_mock.assert_called_with(api._config().wind_dataset_dir)
+
+    @patch('tawhiri.api.PREDICTION_TIMEOUT', 0.1)
+    @patch('tawhiri.api._discard_prediction_pool')
+    @patch('tawhiri.api._resolve_dataset')
+    def test_prediction_pool_timeout(self, resolve_mock, discard_mock):
+        """A prediction which times out stops its pool being used."""
+        started, finish = threading.Event(), threading.Event()
+        def solve(req, ds_time):
+            started.set()
+            finish.wait()
+
+        req = dict(profile=api.PROFILE_STANDARD, launch_datetime=1408489200)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            with patch('tawhiri.api._get_prediction_pool',
+                       return_value=pool), \
+                    patch('tawhiri.api._solve_in_process', solve):
+                try:
+                    with self.assertRaises(api.PredictionException):
+                        api.run_prediction(dict(req))
+                    self.assertTrue(started.is_set())
+                    discard_mock.assert_called_once_with(pool)
+                finally:
+                    finish.set()
+
+    @patch('tawhiri.api._resolve_dataset')
+    def test_prediction_pool_broken(self, resolve_mock):
+        """A pool whose idle process died is replaced, not used again."""
+        def solve(req, ds_time):
+            return [[(1, 52, 0, 0)], [(2, 53, 0, 0)]], {}
+
+        broken = ProcessPoolExecutor(max_workers=1)
+        os.kill(broken.submit(os.getpid).result(), signal.SIGKILL)
+        with self.assertRaises(BrokenProcessPool):
+            broken.submit(os.getpid).result(timeout=10)
+
+        req = dict(profile=api.PROFILE_STANDARD, launch_datetime=1408489200)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            with patch('tawhiri.api._get_prediction_pool',
+                       side_effect=[broken, pool]), \
+                    patch('tawhiri.api._discard_prediction_pool') \
+                    as discard_mock, \
+                    patch('tawhiri.api._solve_in_process', solve):
+                resp = api.run_prediction(dict(req))
+        discard_mock.assert_called_once_with(broken)
+        self.assertEqual(resp['prediction'][0]['trajectory'][0]['latitude'], 52)
+        broken.shutdown()
+
+    @patch('tawhiri.api.run_prediction')
+    def test_batch(self, run_prediction_mock):
+        """Batched predictions are run in turn, with per-prediction errors."""
+        run_prediction_mock.side_effect = \
+            lambda req: {'request': req, 'prediction': []}
+        valid = dict(launch_latitude=52.1, launch_longitude=0.3,
+                     launch_altitude=0, launch_datetime='2014-08-19T23:00:00Z',
+                     ascent_rate=5, descent_rate=10, burst_altitude=30000)
+        body = {'predictions': [valid, {'launch_latitude': 52.1}, 'invalid']}
+
+        response = self.client.post(API_ROOT + 'batch', json=body)
+        self.assert200(response)
+        results = response.json['results']
+        self.assertEqual(results[0]['request']['launch_latitude'], 52.1)
+        self.assertEqual(results[1]['error']['type'], 'RequestException')
+        self.assertEqual(results[2]['error']['type'], 'RequestException')
+        self.assertIn('metadata', response.json)
+
+        # Too many predictions, or a malformed body, fail the whole request
+        body = {'predictions': [valid] * (api._config().max_batch_size + 1)}
+        self.assert400(self.client.post(API_ROOT + 'batch', json=body))
+        self.assert400(self.client.post(API_ROOT + 'batch', json=[valid]))
+
+    @patch('tawhiri.api.run_prediction')
+    def test_batch_pool(self, run_prediction_mock):
+        """With a prediction pool, batched predictions are run together."""
+        # Each prediction waits for the other, so fails unless both are run
+        # at once.
+        barrier = threading.Barrier(2, timeout=5)
+        def run_prediction(req):
+            barrier.wait()
+            return {'request': req, 'prediction': []}
+        run_prediction_mock.side_effect = run_prediction
+        predictions = [
+            dict(launch_latitude=latitude, launch_longitude=0.3,
+                 launch_altitude=0, launch_datetime='2014-08-19T23:00:00Z',
+                 ascent_rate=5, descent_rate=10, burst_altitude=30000)
+            for latitude in (52.1, 52.2)]
+
+        config = api._config()
+        app.extensions['tawhiri'] = \
+            dataclasses.replace(config, prediction_processes=2)
+        try:
+            with patch('tawhiri.api._get_prediction_pool'):
+                response = self.client.post(API_ROOT + 'batch',
+                                            json={'predictions': predictions})
+        finally:
+            app.extensions['tawhiri'] = config
+        self.assert200(response)
+        self.assertEqual([result['request']['launch_latitude']
+                          for result in response.json['results']],
+                         [52.1, 52.2])
+
+    @patch('tawhiri.api.WindDataset')
+    @patch('tawhiri.api.run_prediction')
+    def test_prediction_cache(self, run_prediction_mock, wind_ds_mock):
+        """Identical requests re-use the response, and can be cached."""
+        run_prediction_mock.side_effect = \
+            lambda req: {'request': dict(req), 'prediction': []}
+        wind_ds_mock.listdir.return_value = [
+            MagicMock(suffix='', ds_time=datetime(2014, 8, 19, 18))]
+        qs = urlencode(dict(launch_latitude=52.1, launch_longitude=0.3,
+                            launch_altitude=0, ascent_rate=5, descent_rate=10,
+                            burst_altitude=30000,
+                            launch_datetime='2014-08-19T23:00:00Z'))
+
+        response = self.client.get(API_ROOT + '?' + qs)
+        self.assert200(response)
+        etag = response.headers['ETag']
+        self.assertIn('max-age', response.headers['Cache-Control'])
+        self.assertEqual(self.client.get(API_ROOT + '?' + qs).json,
+                         response.json)
+        self.assertEqual(run_prediction_mock.call_count, 1)
+
+        # A client which has the response already needn't fetch it again
+        response = self.client.get(API_ROOT + '?' + qs,
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        # ... but a new latest dataset means a new prediction
+        wind_ds_mock.listdir.return_value = [
+            MagicMock(suffix='', ds_time=datetime(2014, 8, 20, 0))]
+        api._invalidate_dataset_index()
+        response = self.client.get(API_ROOT + '?' + qs)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(run_prediction_mock.call_count, 2)
+
+        # Responses are cached serialised, and evicted once they take up too
+        # much memory
+        self.assertEqual(next(reversed(api._predictions.values()))[1],
+                         response.data)
+        self.assertEqual(len(api._predictions), 2)
+        wind_ds_mock.listdir.return_value = [
+            MagicMock(suffix='', ds_time=datetime(2014, 8, 20, 6))]
+        api._invalidate_dataset_index()
+        with patch('tawhiri.api.PREDICTION_CACHE_BYTES', len(response.data)):
+            response = self.client.get(API_ROOT + '?' + qs)
+        self.assertEqual([body for _, body in api._predictions.values()],
+                         [response.data])
+
+        # A client which has a response needn't wait for it to be run again if
+        # this process no longer has it
+        etag = response.headers['ETag']
+        api._clear_predictions()
+        response = self.client.get(API_ROOT + '?' + qs,
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(run_prediction_mock.call_count, 3)
+
+    @patch('tawhiri.api.WindDataset')
+    def test_load_datasets(self, wind_ds_mock):
+        """The datasets present are listed, along with the request."""
+        wind_ds_mock.listdir.return_value = [WindDataset._listdir_type(
+            datetime(2014, 8, 19, 18), '', '2014081918', '/ds/2014081918')]
+
+        response = self.client.get(API_ROOT + '?type=load_datasets&foo=1&foo=2')
+        self.assert200(response)
+        self.assertEqual(response.json['request'],
+                         {'type': 'load_datasets', 'foo': '1'})
+        self.assertEqual(response.json['datasets'][0][1:],
+                         ['', '2014081918', '/ds/2014081918'])
+
+    def test_warningcounts_reused(self):
+        """WarningCounts are pooled, and reset between predictions."""
+        with api._checkout_warningcounts() as warningcounts:
+            warningcounts.altitude_too_high = 3
+            # Concurrent predictions each get their own
+            with api._checkout_warningcounts() as other:
+                self.assertIsNot(other, warningcounts)
+
+        with api._checkout_warningcounts() as reused:
+            self.assertIs(reused, warningcounts)
+            self.assertFalse(reused.any)
+
+    @patch('tawhiri.api.STREAM_CHUNK_POINTS', 2)
+    def test_stream_prediction(self):
+        """Streamed predictions decode to the same response."""
+        point = {'latitude': 52.0, 'longitude': 0.1, 'altitude': 100.0,
+                 'datetime': '2014-08-19T23:00:00Z'}
+        resp = {
+            'request': {'version': 1, 'profile': 'standard_profile'},
+            'prediction': [
+                {'stage': 'ascent', 'trajectory': [point] * 5},
+                {'stage': 'descent', 'trajectory': []},
+            ],
+            'warnings': {},
+        }
+        body = b''.join(api._stream_prediction(resp))
+        self.assertEqual(json.loads(body), resp)
+
+
+class DatasetNameTest(TestCase):
+    def create_app(self):
+        return app
+
+    def test_date_to_dataset_name(self):
+        """Launch times map to the preceding 6-hourly dataset, in UTC."""
+        # 2014-08-19T23:00:00Z
+        name, ds_time = api._date_to_dataset_name(1408489200)
+        self.assertEqual(name, '2014081918')
+        self.assertEqual(ds_time, datetime(2014, 8, 19, 18))
+
+        # 2014-08-20T05:59:59Z
+        name, ds_time = api._date_to_dataset_name(1408514399)
+        self.assertEqual(name, '2014082000')
+        self.assertEqual(ds_time, datetime(2014, 8, 20, 0))
+
+
+class RFC3339Test(TestCase):
+    def create_app(self):
+        return app
+
+    def test_rfc3339_to_timestamp(self):
+        """The fast path agrees with strict_rfc3339, and defers to it."""
+        for dt in ('2014-08-19T23:00:00Z', '2016-02-29T00:00:00Z',
+                   '2014-08-19T23:00:00.5Z', '2014-08-19T23:00:00+01:00',
+                   '2014-08-19T23:00:00.25-03:30',
+                   '2014-08-19T23:00:00.123456789Z'):
+            self.assertEqual(api._rfc3339_to_timestamp(dt),
+                             strict_rfc3339.rfc3339_to_timestamp(dt))
+
+        for dt in ('2015-02-29T00:00:00Z', '2014-13-19T23:00:00Z',
+                   '2014-08-19T24:00:00Z', '2014-08-19 23:00:00Z',
+                   '2014-08-19t23:00:00z', '19/08/2014 23:00:00',
+                   '2014-08-19T23:00:00+24:00'):
+            with self.assertRaises(ValueError):
+                api._rfc3339_to_timestamp(dt)
+
+    @patch('tawhiri.api.ciso8601', None)
+    def test_rfc3339_to_timestamp_without_ciso8601(self):
+        """Without ciso8601, timestamps are parsed by the regex fast path."""
+        self.test_rfc3339_to_timestamp()
+
+        # Edge cases, and those left to strict_rfc3339 (days past the 28th,
+        # non-ASCII digits)
+        for dt in ('2014-08-31T23:59:59Z', '0001-01-01T00:00:00Z',
+                   '2014-08-19T00:00:00.000001-23:59',
+                   '２０１４-08-19T23:00:00Z'):
+            self.assertEqual(api._rfc3339_to_timestamp(dt),
+                             strict_rfc3339.rfc3339_to_timestamp(dt))
+
+        for dt in ('2014-04-31T00:00:00Z', '2014-08-19T23:60:00Z',
+                   '2014-08-19T23:00:00+01:60', '2014-08-19T23:00:00',
+                   '2014-08-19T23:00:00.Z', '2014-08-19t23:00:00z'):
+            with self.assertRaises(ValueError):
+                api._rfc3339_to_timestamp(dt)
+
+    def test_timestamp_to_rfc3339(self):
+        for ts in (1408489200, 1408489200.0, 1408489200.25, 0,
+                   1408489200.9999996, 1408489200.0000004, -0.5):
+            self.assertEqual(api._timestamp_to_rfc3339(ts),
+                             strict_rfc3339.timestamp_to_rfc3339_utcoffset(ts))
+
+    def test_timestamps_to_rfc3339(self):
+        timestamps = [1408489200, 1408489260.0, 1408489272.5, 1408489320.0]
+        self.assertEqual(api._timestamps_to_rfc3339(timestamps),
+                         [strict_rfc3339.timestamp_to_rfc3339_utcoffset(ts)
+                          for ts in timestamps])
+        self.assertEqual(api._timestamps_to_rfc3339([]), [])